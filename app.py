@@ -5,10 +5,19 @@ import plotly.express as px
 from plotly.subplots import make_subplots
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import time
 from datetime import datetime
 import ssl
 import urllib3
+import asyncio
+import orjson
+import threading
+import websockets
+import uuid
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Disable SSL warnings for older Python versions
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -20,13 +29,83 @@ st.set_page_config(
     layout="wide"
 )
 
+# Symbols offered in the position form - the only ones we need prices for
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "ADAUSDT", "SOLUSDT", "DOGEUSDT", "XRPUSDT",
+           "LTCUSDT", "AVAXUSDT", "DOTUSDT", "LINKUSDT", "BANANAS31USDT", "BROCCOLI714USDT"]
+
 st.title("📈 Binance Futures Cross Margin Calculator")
 st.markdown("Calculate liquidation prices, PnL, and visualize your cross margin positions with **LIVE PRICES**")
 
+# Display formats for numeric table columns, applied by the frontend so the
+# dataframes keep their numeric dtype (and stay sortable)
+PRICE_COLUMN = st.column_config.NumberColumn(format="$%.6f")
+USDT_COLUMN = st.column_config.NumberColumn(format="$%.2f")
+LEVERAGE_COLUMN = st.column_config.NumberColumn(format="%dx")
+PERCENT_COLUMN = st.column_config.NumberColumn(format="%.2f%%")
+
 # Enhanced Live Price Functions with better error handling
-@st.cache_data(ttl=30)  # Cache for 30 seconds
-def get_binance_prices():
-    """Fetch live prices from Binance API with enhanced error handling for deployment"""
+@st.cache_resource
+def get_http_session():
+    """Shared HTTP session so price polls reuse pooled keep-alive connections"""
+    session = requests.Session()
+    session.headers.update({'Accept-Encoding': 'gzip'})
+
+    # One pooled connection per symbol, since prices are fetched concurrently
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=len(SYMBOLS))
+    session.mount("https://", adapter)
+    return session
+
+def fetch_symbol_prices(url, headers, timeout, verify):
+    """Fetch prices for SYMBOLS concurrently, one small request per symbol
+
+    Returns the prices found and the status codes of any failed requests. A
+    request that raises only loses its own symbol; the first such error is
+    re-raised if no symbol returned a price at all.
+    """
+    session = get_http_session()
+
+    def fetch(symbol):
+        try:
+            response = session.get(
+                url,
+                params={'symbol': symbol},
+                headers=headers,
+                timeout=timeout,
+                verify=verify
+            )
+        except requests.exceptions.RequestException as e:
+            return symbol, None, e
+        if response.status_code != 200:
+            return symbol, None, response.status_code
+
+        try:
+            return symbol, float(orjson.loads(response.content)['price']), None
+        except (KeyError, ValueError, TypeError):
+            return symbol, None, None
+
+    prices = {}
+    failed_statuses = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=len(SYMBOLS)) as executor:
+        for symbol, price, failure in executor.map(fetch, SYMBOLS):
+            if price is not None:
+                prices[symbol] = price
+            elif isinstance(failure, Exception):
+                errors.append(failure)
+            elif failure is not None:
+                failed_statuses.append(failure)
+
+    if errors and not prices:
+        raise errors[0]
+
+    return prices, failed_statuses
+
+def get_binance_prices(notices):
+    """Fetch live prices from Binance API with enhanced error handling for deployment
+
+    Status messages are appended to ``notices`` as (level, message) tuples
+    instead of being rendered, since this can run on a background thread.
+    """
     try:
         # Primary endpoint
         url = "https://fapi.binance.com/fapi/v1/ticker/price"
@@ -36,63 +115,41 @@ def get_binance_prices():
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'application/json',
             'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1'
         }
 
         # Try with SSL verification first
         try:
-            response = requests.get(
-                url,
-                headers=headers,
-                timeout=15,
-                verify=True
-            )
+            prices, failed_statuses = fetch_symbol_prices(url, headers, timeout=15, verify=True)
         except (requests.exceptions.SSLError, ssl.SSLError):
             # If SSL fails, try without verification (common on some cloud platforms)
-            st.warning("SSL verification failed, trying without SSL verification...")
-            response = requests.get(
-                url,
-                headers=headers,
-                timeout=15,
-                verify=False
-            )
+            notices.append(('warning', "SSL verification failed, trying without SSL verification..."))
+            prices, failed_statuses = fetch_symbol_prices(url, headers, timeout=15, verify=False)
 
-        if response.status_code == 200:
-            data = response.json()
-            prices = {}
-            for item in data:
-                symbol = item['symbol']
-                if symbol.endswith('USDT'):
-                    try:
-                        prices[symbol] = float(item['price'])
-                    except (ValueError, TypeError):
-                        continue
-
-            if prices:
-                return prices, True
-            else:
-                st.error("No valid price data received from Binance")
-                return {}, False
+        if prices:
+            return prices, True
+        elif failed_statuses:
+            notices.append(('error', f"Binance API returned status code: {failed_statuses[0]}"))
+            return {}, False
         else:
-            st.error(f"Binance API returned status code: {response.status_code}")
+            notices.append(('error', "No valid price data received from Binance"))
             return {}, False
 
     except requests.exceptions.Timeout:
-        st.error("Binance API request timed out")
-        return try_alternative_endpoint()
+        notices.append(('error', "Binance API request timed out"))
+        return try_alternative_endpoint(notices)
     except requests.exceptions.ConnectionError:
-        st.error("Connection error to Binance API")
-        return try_alternative_endpoint()
+        notices.append(('error', "Connection error to Binance API"))
+        return try_alternative_endpoint(notices)
     except requests.exceptions.RequestException as e:
-        st.error(f"Request error: {str(e)}")
-        return try_alternative_endpoint()
+        notices.append(('error', f"Request error: {str(e)}"))
+        return try_alternative_endpoint(notices)
     except Exception as e:
-        st.error(f"Unexpected error fetching prices: {str(e)}")
+        notices.append(('error', f"Unexpected error fetching prices: {str(e)}"))
         return {}, False
 
-def try_alternative_endpoint():
+def try_alternative_endpoint(notices):
     """Try alternative Binance endpoint"""
     try:
         # Alternative endpoint - spot prices (often more reliable)
@@ -102,46 +159,189 @@ def try_alternative_endpoint():
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
 
-        response = requests.get(url, headers=headers, timeout=10, verify=False)
+        # Symbols that are futures-only simply come back as failed requests
+        prices, _ = fetch_symbol_prices(url, headers, timeout=10, verify=False)
 
-        if response.status_code == 200:
-            data = response.json()
-            prices = {}
-            for item in data:
-                symbol = item['symbol']
-                if symbol.endswith('USDT'):
-                    try:
-                        prices[symbol] = float(item['price'])
-                    except (ValueError, TypeError):
-                        continue
-
-            if prices:
-                st.info("Using spot prices from alternative endpoint")
-                return prices, True
+        if prices:
+            notices.append(('info', "Using spot prices from alternative endpoint"))
+            return prices, True
 
     except Exception as e:
-        st.error(f"Alternative endpoint also failed: {str(e)}")
+        notices.append(('error', f"Alternative endpoint also failed: {str(e)}"))
 
     return {}, False
 
-def get_live_prices():
-    """Get live prices from Binance API with fallback"""
-    prices, success = get_binance_prices()
-
-    if not success or not prices:
-        # Show more detailed error information
-        st.error("❌ Unable to fetch live prices from Binance API")
-        st.info("This might be due to:")
-        st.markdown("""
-        - **Render.com firewall/proxy issues**
-        - **SSL certificate problems** 
-        - **Rate limiting from Binance**
-        - **Network connectivity issues**
-        - **DNS resolution problems**
-        """)
+# Stale-while-revalidate cache for REST prices - readers get the last fetched
+# prices immediately and a background thread refreshes them once stale, unless
+# they are missing or too old to pass off as live
+PRICE_CACHE_TTL = 30  # Seconds before cached REST prices are considered stale
+PRICE_CACHE_MAX_STALE = 300  # Seconds past which readers wait for a fresh fetch
+
+@st.cache_resource
+def get_price_cache():
+    """Shared REST price cache, created once per server process"""
+    lock = threading.Lock()
+    return {
+        'prices': {},
+        'success': False,
+        'notices': [],
+        'fetched_at': 0.0,
+        'refreshing': False,
+        'lock': lock,
+        'refreshed': threading.Condition(lock)
+    }
+
+def refresh_price_cache(cache):
+    """Fetch REST prices and atomically swap them into the cache"""
+    notices = []
+    prices, success = {}, False
+    try:
+        prices, success = get_binance_prices(notices)
+    finally:
+        with cache['lock']:
+            cache['prices'] = prices
+            cache['success'] = success
+            cache['notices'] = notices
+            cache['fetched_at'] = time.time()
+            cache['refreshing'] = False
+            cache['refreshed'].notify_all()
+
+def clear_price_cache():
+    """Force the next read of the REST price cache to fetch synchronously"""
+    cache = get_price_cache()
+    with cache['lock']:
+        cache['fetched_at'] = 0.0
+
+def get_cached_prices():
+    """Return cached REST prices, refreshing them in the background once stale"""
+    cache = get_price_cache()
+
+    fetch_now = False
+    with cache['lock']:
+        if time.time() - cache['fetched_at'] > PRICE_CACHE_MAX_STALE:
+            # Nothing usable cached (first read, cleared, or far too old) - the
+            # read has to wait for the network, joining a fetch already in flight
+            if cache['refreshing']:
+                cache['refreshed'].wait_for(lambda: not cache['refreshing'])
+            else:
+                cache['refreshing'] = True
+                fetch_now = True
+
+    if fetch_now:
+        refresh_price_cache(cache)
+
+    with cache['lock']:
+        is_stale = time.time() - cache['fetched_at'] > PRICE_CACHE_TTL
+        if is_stale and not cache['refreshing']:
+            cache['refreshing'] = True
+            threading.Thread(
+                target=refresh_price_cache,
+                args=(cache,),
+                name="binance-price-refresh",
+                daemon=True
+            ).start()
+
+        return dict(cache['prices']), cache['success'], list(cache['notices'])
+
+# Live price stream - Binance pushes miniTicker updates for the subscribed
+# symbols over a single websocket, so we avoid re-downloading tickers via REST
+BINANCE_FUTURES_STREAM_URL = "wss://fstream.binance.com/stream?streams=" + "/".join(
+    f"{symbol.lower()}@miniTicker" for symbol in SYMBOLS
+)
+STREAM_STALE_AFTER = 10  # Seconds without a message before a symbol falls back to REST
+
+def handle_futures_ticker(stream, message):
+    """Store the latest close price from a single-symbol miniTicker message"""
+    ticker = orjson.loads(message).get('data', {})
+    symbol = ticker.get('s', '')
+    if not symbol.endswith('USDT'):
+        return
+
+    try:
+        price = float(ticker['c'])
+    except (KeyError, ValueError, TypeError):
+        return
+
+    with stream['lock']:
+        stream['prices'][symbol] = price
+        stream['updated_at'][symbol] = time.time()
+
+async def listen_price_stream(stream):
+    """Keep the websocket connection open, reconnecting whenever it drops"""
+    while True:
+        try:
+            async with websockets.connect(stream['url'], open_timeout=10, ping_interval=20) as websocket:
+                async for message in websocket:
+                    handle_futures_ticker(stream, message)
+        except Exception:
+            # Connection refused or dropped - back off before reconnecting
+            await asyncio.sleep(5)
+
+@st.cache_resource
+def start_price_stream():
+    """Start the background price stream once per server process"""
+    stream = {
+        'url': BINANCE_FUTURES_STREAM_URL,
+        'prices': {},
+        'lock': threading.Lock(),
+        'updated_at': {}
+    }
+    thread = threading.Thread(
+        target=lambda: asyncio.run(listen_price_stream(stream)),
+        name="binance-price-stream",
+        daemon=True
+    )
+    thread.start()
+    return stream
+
+def get_stream_prices():
+    """Return a snapshot of the streamed prices, leaving out symbols that have gone stale"""
+    stream = start_price_stream()
+    now = time.time()
+    with stream['lock']:
+        return {
+            symbol: price
+            for symbol, price in stream['prices'].items()
+            if now - stream['updated_at'][symbol] <= STREAM_STALE_AFTER
+        }
+
+def get_live_prices(show_status=True):
+    """Get live prices from the websocket stream, falling back to the REST API
+
+    Set ``show_status`` to False to skip rendering fetch errors and notices.
+    """
+    stream_prices = get_stream_prices()
+    if all(symbol in stream_prices for symbol in SYMBOLS):
+        return stream_prices
+
+    # Fill symbols the stream hasn't (recently) delivered from REST, preferring
+    # the fresher streamed price wherever there is one
+    prices, success, notices = get_cached_prices()
+    if show_status:
+        for level, message in notices:
+            getattr(st, level)(message)
+
+    if success:
+        prices.update(stream_prices)
+    else:
+        prices = stream_prices
+
+    if not prices:
+        if show_status:
+            # Show more detailed error information
+            st.error("❌ Unable to fetch live prices from Binance API")
+            st.info("This might be due to:")
+            st.markdown("""
+            - **Render.com firewall/proxy issues**
+            - **SSL certificate problems** 
+            - **Rate limiting from Binance**
+            - **Network connectivity issues**
+            - **DNS resolution problems**
+            """)
+
+            st.warning("🔄 Using default fallback prices")
 
         # Return more realistic default prices
-        st.warning("🔄 Using default fallback prices")
         return {
             "BTCUSDT": 43500.0,
             "ETHUSDT": 2650.0,
@@ -159,6 +359,397 @@ def get_live_prices():
 
     return prices
 
+# Position storage - positions are kept column-wise (one array per field) so the
+# PnL and liquidation math runs on contiguous arrays instead of per-position dicts
+def empty_positions():
+    """An empty set of positions; side is +1 for LONG and -1 for SHORT"""
+    return {
+        'crypto': [],
+        'side': np.array([], dtype=np.int8),
+        'entry': np.array([], dtype=float),
+        'size': np.array([], dtype=float),
+        'qty': np.array([], dtype=float),
+        'lev': np.array([], dtype=np.int16),
+        'mmr': np.array([], dtype=float)
+    }
+
+def append_position(positions, crypto, position_type, entry_price, position_size, leverage, maintenance_margin_rate):
+    """Return the positions with one more position appended to every column"""
+    return {
+        'crypto': positions['crypto'] + [crypto],
+        'side': np.append(positions['side'], 1 if position_type == 'LONG' else -1).astype(np.int8),
+        'entry': np.append(positions['entry'], entry_price),
+        'size': np.append(positions['size'], position_size),
+        'qty': np.append(positions['qty'], position_size / entry_price),
+        'lev': np.append(positions['lev'], leverage).astype(np.int16),
+        'mmr': np.append(positions['mmr'], maintenance_margin_rate)
+    }
+
+def positions_to_frame(positions):
+    """Positions as a DataFrame with the column names used by the tables and charts"""
+    positions_df = pd.DataFrame({
+        'crypto': positions['crypto'],
+        'type': np.where(positions['side'] > 0, 'LONG', 'SHORT'),
+        'side': positions['side'],
+        'entry_price': positions['entry'],
+        'leverage': positions['lev'],
+        'position_size': positions['size'],
+        'maintenance_margin_rate': positions['mmr'],
+        'quantity': positions['qty']
+    })
+    positions_df['margin_used'] = positions_df['position_size'] / positions_df['leverage']
+    return positions_df
+
+# Position helpers - derived data only depends on the positions themselves, so it
+# is cached on a hashable snapshot and reused while only prices are changing
+def positions_key(positions):
+    """Hashable snapshot of the positions, used as the cache key for derived data"""
+    return tuple(zip(
+        positions['crypto'],
+        ['LONG' if side > 0 else 'SHORT' for side in positions['side']],
+        positions['entry'].tolist(),
+        positions['size'].tolist(),
+        positions['lev'].tolist(),
+        positions['mmr'].tolist()
+    ))
+
+@st.cache_data
+def get_unique_cryptos(positions_tuple):
+    """Symbols with open positions, in the order they were first added"""
+    return list(dict.fromkeys(crypto for crypto, *_ in positions_tuple))
+
+@st.cache_data
+def build_groups(positions_tuple):
+    """Group positions by crypto and direction the way Binance does
+
+    Returns the groups keyed by "<crypto>_<type>" and their total maintenance margin.
+    """
+    grouped_positions = {}
+    for crypto, position_type, entry_price, position_size, leverage, maintenance_margin_rate in positions_tuple:
+        key = f"{crypto}_{position_type}"
+        if key not in grouped_positions:
+            grouped_positions[key] = {
+                'crypto': crypto,
+                'type': position_type,
+                'total_size': 0,
+                'total_margin': 0,
+                'total_quantity': 0,
+                'weighted_price_sum': 0,
+                'mmr_sum': 0,
+                'positions_count': 0
+            }
+
+        # Accumulate everything the group needs in a single pass
+        group = grouped_positions[key]
+        quantity = position_size / entry_price
+        group['total_size'] += position_size
+        group['total_margin'] += position_size / leverage
+        group['total_quantity'] += quantity
+        group['weighted_price_sum'] += entry_price * quantity
+        group['mmr_sum'] += maintenance_margin_rate
+        group['positions_count'] += 1
+
+    # Derive weighted average entry prices and maintenance margins from the totals
+    for group in grouped_positions.values():
+        group['avg_mmr'] = group['mmr_sum'] / group['positions_count']
+        group['weighted_entry_price'] = group['weighted_price_sum'] / group['total_quantity'] if group['total_quantity'] > 0 else 0
+        group['average_leverage'] = group['total_size'] / group['total_margin'] if group['total_margin'] > 0 else 1
+        group['maintenance_margin'] = group['total_size'] * group['avg_mmr']
+
+    total_maintenance_margin = sum(group['maintenance_margin'] for group in grouped_positions.values())
+    return grouped_positions, total_maintenance_margin
+
+def compute_cross_margin(entries, quantities, sizes, mmrs, sides, prices, wallet_balance):
+    """Binance-style cross margin PnL, liquidation price and distance for each group
+
+    All arguments except ``wallet_balance`` are float64 arrays with one element
+    per position group; ``sides`` is +1 for LONG and -1 for SHORT.
+    Returns ``(pnls, liquidation_prices, distances_to_liquidation_pct)``.
+    """
+    pnls = sides * (prices - entries) * quantities
+    maintenance_margins = sizes * mmrs
+
+    # Available balance for each group = wallet + other groups' PnL - other groups' maintenance margins
+    available_balances = (wallet_balance
+                          + (pnls.sum() - pnls)
+                          - (maintenance_margins.sum() - maintenance_margins))
+
+    # Liquidation when the group's unrealized loss + maintenance margin = available balance:
+    # LONG:  liq_price = entry_price - (available_balance - maintenance_margin) / quantity
+    # SHORT: liq_price = entry_price + (available_balance - maintenance_margin) / quantity
+    liquidation_prices = entries - sides * (available_balances - maintenance_margins) / quantities
+
+    # Ensure liquidation price is positive and reasonable
+    liquidation_prices = np.where(
+        liquidation_prices <= 0,
+        np.where(sides > 0, entries * 0.01, entries * 100),
+        liquidation_prices
+    )
+
+    distances = np.abs((liquidation_prices - prices) / prices * 100)
+    return pnls, liquidation_prices, distances
+
+# Position persistence - each portfolio is saved to its own parquet file, keyed
+# by a portfolio id kept in the URL so a page refresh reloads the same positions
+POSITIONS_DIR = Path(__file__).parent / "positions"
+
+def get_portfolio_path():
+    """Parquet path for this browser's portfolio, creating a portfolio id if needed"""
+    portfolio_id = st.query_params.get("portfolio", "")
+    if not portfolio_id.isalnum():
+        portfolio_id = uuid.uuid4().hex[:12]
+        st.query_params["portfolio"] = portfolio_id
+    return POSITIONS_DIR / f"{portfolio_id}.parquet"
+
+@st.cache_data
+def load_positions(path):
+    """Load saved positions, or empty positions if none have been saved yet"""
+    if not Path(path).exists():
+        return empty_positions()
+
+    saved_df = pd.read_parquet(path)
+    positions = {field: saved_df[field].to_numpy(dtype=values.dtype)
+                 for field, values in empty_positions().items() if field != 'crypto'}
+    positions['crypto'] = saved_df['crypto'].tolist()
+    return positions
+
+def save_positions(path, positions):
+    """Write positions to disk (removing the file once empty) and invalidate the load cache"""
+    if positions['crypto']:
+        POSITIONS_DIR.mkdir(exist_ok=True)
+        pd.DataFrame(positions).to_parquet(path, index=False)
+    else:
+        Path(path).unlink(missing_ok=True)
+    load_positions.clear()
+
+# Chart builders - left uncached, since their inputs change with every price tick
+def build_pnl_bar(pnl_df):
+    """Bar chart of PnL per position"""
+    fig_pnl = px.bar(
+        pnl_df,
+        x='crypto',
+        y='pnl',
+        color='type',
+        title="PnL by Position",
+        labels={'pnl': 'PnL (USDT)', 'crypto': 'Cryptocurrency'},
+        color_discrete_map={'LONG': 'green', 'SHORT': 'red'}
+    )
+    fig_pnl.add_hline(y=0, line_dash="dash", line_color="gray")
+    return fig_pnl
+
+def build_sensitivity(symbol, position_type, entry_price, quantity, current_price):
+    """Line chart of a position's PnL across +/-50% of the current price"""
+    # Create price range and compute PnL across it in one vectorized step
+    price_range = np.linspace(current_price * 0.5, current_price * 1.5, 100)
+    sign = 1 if position_type == 'LONG' else -1
+    pnl_range = sign * (price_range - entry_price) * quantity
+
+    fig_sensitivity = go.Figure()
+    fig_sensitivity.add_trace(go.Scatter(
+        x=price_range,
+        y=pnl_range,
+        mode='lines',
+        name=f"{symbol} PnL",
+        line=dict(color='blue', width=2)
+    ))
+
+    # Add current price line
+    fig_sensitivity.add_vline(
+        x=current_price,
+        line_dash="dash",
+        line_color="orange",
+        annotation_text="Current Price"
+    )
+
+    # Add break-even line
+    fig_sensitivity.add_hline(
+        y=0,
+        line_dash="dash",
+        line_color="gray",
+        annotation_text="Break Even"
+    )
+
+    fig_sensitivity.update_layout(
+        title=f"Price Sensitivity for {symbol}",
+        xaxis_title="Price (USDT)",
+        yaxis_title="PnL (USDT)"
+    )
+    return fig_sensitivity
+
+# Adaptive auto-refresh - poll faster while prices are moving and back off to
+# the slowest interval when successive ticks are (nearly) identical
+REFRESH_STEPS = (2, 5, 10, 20, 30)  # Allowed intervals in seconds, fastest to slowest
+IDLE_MOVE = 0.001  # Largest relative move per slowest interval that still gets the slowest interval
+REFRESH_HYSTERESIS = 1.5  # Factor the target must pass a step boundary by before switching
+PRICE_HISTORY_LENGTH = 10  # Ticks considered when measuring volatility
+
+def record_price_tick(price_history, prices):
+    """Append a price snapshot, skipping reruns that follow the last tick within a second"""
+    now = time.time()
+    if price_history and now - price_history[-1][0] < 1:
+        return
+    price_history.append((now, prices))
+
+def adaptive_refresh_interval(price_history, current_interval=None):
+    """Seconds between auto-refreshes based on the fastest recent price move
+
+    Each tick-to-tick move is scaled by the time between the two ticks, so the
+    measured volatility doesn't depend on the interval being used. The
+    ``current_interval`` is kept until the target moves clearly past one of its
+    step boundaries.
+    """
+    slowest = REFRESH_STEPS[-1]
+    volatility = 0.0
+    for (previous_time, previous), (current_time, current) in zip(price_history, list(price_history)[1:]):
+        elapsed = current_time - previous_time
+        for symbol, price in current.items():
+            previous_price = previous.get(symbol, 0)
+            if previous_price > 0:
+                # Relative move projected over the slowest interval
+                move = abs(price - previous_price) / previous_price / elapsed * slowest
+                volatility = max(volatility, move)
+
+    target = slowest * (IDLE_MOVE / volatility) if volatility else float('inf')
+
+    if current_interval in REFRESH_STEPS:
+        index = REFRESH_STEPS.index(current_interval)
+        upper = REFRESH_STEPS[index + 1] if index + 1 < len(REFRESH_STEPS) else float('inf')
+        if current_interval / REFRESH_HYSTERESIS <= target < upper * REFRESH_HYSTERESIS:
+            return current_interval
+
+    # Snap down to a fixed step so small changes in volatility don't re-register the fragment
+    target = min(slowest, max(REFRESH_STEPS[0], target))
+    return max(step for step in REFRESH_STEPS if step <= target)
+
+def build_footer(wallet, balance, mm, ratio):
+    """Cross margin explainer shown in the footer, filled in with the account metrics"""
+    return f"""
+        **How Binance Cross Margin Liquidation Actually Works:**
+        
+        1️⃣ **Position Grouping**: Binance groups positions by crypto + direction (LONG/SHORT)
+           - Multiple BTCUSDT LONG positions → 1 combined BTCUSDT LONG position
+           - Entry price becomes weighted average based on position sizes
+           
+        2️⃣ **Dynamic Liquidation Prices**: Unlike isolated margin, liquidation prices change in real-time
+           - Considers your entire wallet balance: ${wallet:.2f}
+           - Includes unrealized PnL from OTHER positions
+           - Accounts for maintenance margins from ALL positions
+           
+        3️⃣ **Cross Margin Formula**: For each position group:
+           - **LONG Liquidation** = Entry Price - (Available Balance - Maintenance Margin) ÷ Quantity
+           - **SHORT Liquidation** = Entry Price + (Available Balance - Maintenance Margin) ÷ Quantity
+           - Available Balance = Wallet + Other Positions PnL - Other Maintenance Margins
+        
+        4️⃣ **Liquidation Trigger**: When Total Account Balance ≤ Total Maintenance Margin
+           - Current condition: ${balance:.2f} vs ${mm:.2f} required
+           - Margin Ratio: {ratio:.1f}% (liquidation at 100%)
+           
+        5️⃣ **Key Insight**: Profitable positions extend liquidation prices of losing positions!
+           - If you have a winning ETHUSDT position, your BTCUSDT liquidation price becomes more favorable
+           - Losing positions make other positions' liquidation prices worse
+        """
+
+# Live price and PnL block - run as an st.fragment so auto-refresh ticks only
+# rerun this block instead of the whole script (groupings, charts, tables)
+def live_pnl_block(positions_df, unique_cryptos, pos_by_crypto, manual_overrides, wallet_balance, refresh_interval):
+    """Render live prices and PnL metrics for the current positions
+
+    On full runs this returns the per-position PnL frame (including each
+    position's current price) and the account totals used by the rest of the
+    page; on its own timed reruns only this block is refreshed.
+    """
+    # Only timed reruns feed the volatility history, so full runs triggered by
+    # the user don't change it (and can't trigger an interval switch)
+    timed_run = not st.session_state.pop('live_pnl_full_run', False)
+
+    block_prices = get_live_prices(show_status=False)
+    if timed_run:
+        record_price_tick(
+            st.session_state.price_history,
+            {crypto: block_prices[crypto] for crypto in unique_cryptos if crypto in block_prices}
+        )
+
+    # Current price inputs with live prices
+    st.subheader("📊 Current Prices")
+
+    # Show price source status
+    sample_price = block_prices.get("BTCUSDT", 0)
+    if sample_price == 43500.0:  # Our fallback value
+        st.info("📊 Currently using fallback prices - prices may not reflect real market conditions")
+    else:
+        st.success("📊 Using live prices from Binance API")
+
+    current_prices = {}
+
+    # Create columns for price display
+    cols = st.columns(min(len(unique_cryptos), 4))
+    for i, crypto in enumerate(unique_cryptos):
+        with cols[i % 4]:
+            # Get live price
+            live_price = block_prices.get(crypto, 0)
+
+            # Get entry price for reference
+            entry_price = pos_by_crypto[crypto]['entry_price']
+
+            # Calculate price change
+            if live_price > 0:
+                price_change = ((live_price - entry_price) / entry_price) * 100
+
+                st.metric(
+                    label=f"{crypto}",
+                    value=f"${live_price:,.6f}",
+                    delta=f"{price_change:+.2f}%"
+                )
+                current_prices[crypto] = live_price
+            else:
+                st.error(f"No price data for {crypto}")
+                current_prices[crypto] = entry_price
+
+    # Apply manual overrides
+    current_prices.update(manual_overrides)
+
+    # Calculate PnL and maintenance margin for all positions column-wise
+    pnl_df = positions_df[['crypto', 'type', 'entry_price', 'leverage', 'position_size']].copy()
+    pnl_df['current_price'] = pnl_df['crypto'].map(current_prices).fillna(pnl_df['entry_price'])
+
+    pnl_df['pnl'] = positions_df['side'] * (pnl_df['current_price'] - pnl_df['entry_price']) * positions_df['quantity']
+    pnl_df['maintenance_margin'] = positions_df['position_size'] * positions_df['maintenance_margin_rate']
+
+    total_pnl = float(pnl_df['pnl'].sum())
+    total_maintenance_margin = float(pnl_df['maintenance_margin'].sum())
+
+    # Display metrics
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.metric("Total PnL", f"${total_pnl:.2f}", f"{total_pnl:.2f}")
+
+    with col2:
+        st.metric("Total Maintenance Margin", f"${total_maintenance_margin:.2f}")
+
+    with col3:
+        current_balance = wallet_balance + total_pnl
+        st.metric("Current Balance", f"${current_balance:.2f}")
+
+    with col4:
+        margin_ratio = (total_maintenance_margin / current_balance * 100) if current_balance > 0 else 100
+        color = "normal" if margin_ratio < 80 else "inverse"
+        st.metric("Margin Ratio", f"{margin_ratio:.1f}%", delta_color=color)
+
+    # Liquidation warning
+    if margin_ratio >= 100:
+        st.error("⚠️ LIQUIDATION RISK! Your margin ratio is at or above 100%")
+    elif margin_ratio >= 80:
+        st.warning("⚠️ HIGH RISK! Your margin ratio is approaching liquidation levels")
+
+    # run_every is fixed when the fragment is registered, so a full rerun is
+    # needed to pick up a new interval once the recent volatility calls for one
+    if timed_run and refresh_interval:
+        if adaptive_refresh_interval(st.session_state.price_history, refresh_interval) != refresh_interval:
+            st.rerun()
+
+    return pnl_df, total_pnl, total_maintenance_margin, margin_ratio
+
 # Add debugging section in sidebar
 st.sidebar.header("🔧 Debug Info")
 if st.sidebar.checkbox("Show Debug Information"):
@@ -181,15 +772,19 @@ if st.sidebar.checkbox("Show Debug Information"):
     except Exception as e:
         st.sidebar.error(f"❌ Binance API error: {str(e)}")
 
-# Initialize session state for positions
+# Initialize session state for positions, restoring any saved portfolio
+portfolio_path = str(get_portfolio_path())
 if 'positions' not in st.session_state:
-    st.session_state.positions = []
+    st.session_state.positions = load_positions(portfolio_path)
 
 if 'auto_refresh' not in st.session_state:
     st.session_state.auto_refresh = False
 
-if 'last_update' not in st.session_state:
-    st.session_state.last_update = time.time()
+if 'price_history' not in st.session_state:
+    st.session_state.price_history = deque(maxlen=PRICE_HISTORY_LENGTH)
+
+if 'refresh_interval' not in st.session_state:
+    st.session_state.refresh_interval = None
 
 # Sidebar for wallet balance and live price settings
 st.sidebar.header("💰 Wallet Settings")
@@ -209,13 +804,14 @@ st.session_state.auto_refresh = auto_refresh
 # Manual refresh button
 if st.sidebar.button("🔄 Refresh Prices Now"):
     st.cache_data.clear()
+    clear_price_cache()
     st.rerun()
 
 # Force refresh button for debugging
 if st.sidebar.button("🔄 Force Refresh (Clear Cache)"):
     st.cache_data.clear()
+    clear_price_cache()
     # Clear the entire cache
-    st.session_state.last_update = 0
     st.rerun()
 
 # Get live prices
@@ -232,23 +828,13 @@ if live_prices:
         st.sidebar.success(f"✅ Live prices loaded ({len(live_prices)} symbols)")
         st.sidebar.caption(f"Last updated: {datetime.now().strftime('%H:%M:%S')}")
 
-# Auto-refresh mechanism
-if auto_refresh:
-    if time.time() - st.session_state.last_update > 30:  # Refresh every 30 seconds
-        st.session_state.last_update = time.time()
-        st.rerun()
-
 # Position input section
 st.header("➕ Add Position")
 
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    crypto = st.selectbox(
-        "Cryptocurrency",
-        ["BTCUSDT", "ETHUSDT", "ADAUSDT", "SOLUSDT", "DOGEUSDT", "XRPUSDT",
-         "LTCUSDT", "AVAXUSDT", "DOTUSDT", "LINKUSDT", "BANANAS31USDT", "BROCCOLI714USDT"]
-    )
+    crypto = st.selectbox("Cryptocurrency", SYMBOLS)
 
 with col2:
     position_type = st.selectbox("Position Type", ["LONG", "SHORT"])
@@ -306,51 +892,51 @@ if st.button("Add Position"):
     margin_used = position_size / leverage  # This is correct: Position Size ÷ Leverage
     quantity = position_size / entry_price  # This is correct: Position Size ÷ Entry Price
 
-    position = {
-        'crypto': crypto,
-        'type': position_type,
-        'entry_price': entry_price,
-        'leverage': leverage,
-        'position_size': position_size,
-        'maintenance_margin_rate': maintenance_margin_rate,
-        'margin_used': margin_used,
-        'quantity': quantity
-    }
-    st.session_state.positions.append(position)
+    st.session_state.positions = append_position(
+        st.session_state.positions,
+        crypto,
+        position_type,
+        entry_price,
+        position_size,
+        leverage,
+        maintenance_margin_rate
+    )
+    save_positions(portfolio_path, st.session_state.positions)
     st.success(f"Added {position_type} position for {crypto} | Margin Used: ${margin_used:.2f} | Quantity: {quantity:.6f}")
 
-# Initialize default values for variables that might be undefined
-total_pnl = 0
-total_maintenance_margin = 0
-margin_ratio = 0
-total_maintenance_margin_grouped = 0
+# Initialize default values for variables that might be undefined (no positions yet)
+total_pnl = 0.0
+total_maintenance_margin = 0.0
+margin_ratio = 0.0
+total_maintenance_margin_grouped = 0.0
 
 # Display current positions
-if st.session_state.positions:
+if st.session_state.positions['crypto']:
     st.header("📊 Current Positions")
 
     # Create positions dataframe
-    positions_df = pd.DataFrame(st.session_state.positions)
-
-    # Display positions table
-    display_positions_df = positions_df.copy()
-    display_positions_df['entry_price'] = display_positions_df['entry_price'].apply(lambda x: f"${x:.6f}")
-    display_positions_df['position_size'] = display_positions_df['position_size'].apply(lambda x: f"${x:.2f}")
-    display_positions_df['margin_used'] = display_positions_df['margin_used'].apply(lambda x: f"${x:.2f}")
-    display_positions_df['leverage'] = display_positions_df['leverage'].apply(lambda x: f"{x}x")
+    positions_df = positions_to_frame(st.session_state.positions)
 
+    # Display positions table - numbers stay numeric and are formatted by the frontend
     st.dataframe(
-        display_positions_df[['crypto', 'type', 'entry_price', 'leverage', 'position_size', 'margin_used']],
+        positions_df[['crypto', 'type', 'entry_price', 'leverage', 'position_size', 'margin_used']],
+        column_config={
+            'entry_price': PRICE_COLUMN,
+            'leverage': LEVERAGE_COLUMN,
+            'position_size': USDT_COLUMN,
+            'margin_used': USDT_COLUMN
+        },
         use_container_width=True
     )
 
     # Clear positions button
     if st.button("Clear All Positions"):
-        st.session_state.positions = []
+        st.session_state.positions = empty_positions()
+        save_positions(portfolio_path, st.session_state.positions)
         st.rerun()
 
     # Calculate total margin used
-    total_margin_used = sum(pos['margin_used'] for pos in st.session_state.positions)
+    total_margin_used = float(positions_df['margin_used'].sum())
     available_balance = wallet_balance - total_margin_used
 
     st.sidebar.metric("Total Margin Used", f"${total_margin_used:.2f}")
@@ -359,44 +945,11 @@ if st.session_state.positions:
     # PnL Calculator Section
     st.header("💹 PnL Calculator & Liquidation Analysis")
 
-    # Current price inputs with live prices
-    st.subheader("📊 Current Prices")
+    positions_tuple = positions_key(st.session_state.positions)
+    unique_cryptos = get_unique_cryptos(positions_tuple)
 
-    # Show price source status
-    sample_price = live_prices.get("BTCUSDT", 0)
-    if sample_price == 43500.0:  # Our fallback value
-        st.info("📊 Currently using fallback prices - prices may not reflect real market conditions")
-    else:
-        st.success("📊 Using live prices from Binance API")
-
-    current_prices = {}
-
-    unique_cryptos = list(set(pos['crypto'] for pos in st.session_state.positions))
-
-    # Create columns for price display
-    cols = st.columns(min(len(unique_cryptos), 4))
-    for i, crypto in enumerate(unique_cryptos):
-        with cols[i % 4]:
-            # Get live price
-            live_price = live_prices.get(crypto, 0)
-
-            # Get entry price for reference
-            entry_price = next(pos['entry_price'] for pos in st.session_state.positions if pos['crypto'] == crypto)
-
-            # Calculate price change
-            if live_price > 0:
-                price_change = ((live_price - entry_price) / entry_price) * 100
-                change_color = "🟢" if price_change > 0 else "🔴" if price_change < 0 else "⚪"
-
-                st.metric(
-                    label=f"{crypto}",
-                    value=f"${live_price:,.6f}",
-                    delta=f"{price_change:+.2f}%"
-                )
-                current_prices[crypto] = live_price
-            else:
-                st.error(f"No price data for {crypto}")
-                current_prices[crypto] = entry_price
+    # Index the first position of each symbol for per-symbol lookups
+    pos_by_crypto = positions_df.drop_duplicates('crypto').set_index('crypto').to_dict('index')
 
     # Manual price override option
     st.subheader("🔧 Manual Price Override (Optional)")
@@ -414,79 +967,36 @@ if st.session_state.positions:
             if manual_price > 0:
                 manual_overrides[crypto] = manual_price
 
-        # Apply manual overrides
-        for crypto, manual_price in manual_overrides.items():
-            current_prices[crypto] = manual_price
-
-    # Calculate PnL and liquidation prices
-    total_pnl = 0
-    total_maintenance_margin = 0
-    liquidation_data = []
-
-    for pos in st.session_state.positions:
-        crypto = pos['crypto']
-        current_price = current_prices.get(crypto, pos['entry_price'])
-
-        # Calculate PnL
-        if pos['type'] == 'LONG':
-            pnl = (current_price - pos['entry_price']) * pos['quantity']
-        else:  # SHORT
-            pnl = (pos['entry_price'] - current_price) * pos['quantity']
-
-        total_pnl += pnl
-
-        # Calculate maintenance margin for this position
-        maintenance_margin = pos['position_size'] * pos['maintenance_margin_rate']
-        total_maintenance_margin += maintenance_margin
-
-        liquidation_data.append({
-            'crypto': crypto,
-            'type': pos['type'],
-            'entry_price': pos['entry_price'],
-            'current_price': current_price,
-            'pnl': pnl,
-            'maintenance_margin': maintenance_margin,
-            'leverage': pos['leverage'],
-            'position_size': pos['position_size']
-        })
-
-    # Calculate cross margin liquidation
-    # Liquidation occurs when: wallet_balance + total_pnl <= total_maintenance_margin
-    # This means: total_pnl <= total_maintenance_margin - wallet_balance
-    liquidation_pnl_threshold = total_maintenance_margin - wallet_balance
-
-    # Display metrics
-    col1, col2, col3, col4 = st.columns(4)
-
-    with col1:
-        st.metric("Total PnL", f"${total_pnl:.2f}", f"{total_pnl:.2f}")
-
-    with col2:
-        st.metric("Total Maintenance Margin", f"${total_maintenance_margin:.2f}")
+    # Auto-refresh reruns just this fragment on a timer; otherwise it updates with the page
+    refresh_interval = None
+    if auto_refresh:
+        refresh_interval = adaptive_refresh_interval(
+            st.session_state.price_history, st.session_state.refresh_interval
+        )
+    st.session_state.refresh_interval = refresh_interval
 
-    with col3:
-        current_balance = wallet_balance + total_pnl
-        st.metric("Current Balance", f"${current_balance:.2f}")
+    st.session_state.live_pnl_full_run = True
+    live_pnl_fragment = st.fragment(live_pnl_block, run_every=refresh_interval)
+    pnl_df, total_pnl, total_maintenance_margin, margin_ratio = live_pnl_fragment(
+        positions_df, unique_cryptos, pos_by_crypto, manual_overrides, wallet_balance, refresh_interval
+    )
 
-    with col4:
-        margin_ratio = (total_maintenance_margin / current_balance * 100) if current_balance > 0 else 100
-        color = "normal" if margin_ratio < 80 else "inverse"
-        st.metric("Margin Ratio", f"{margin_ratio:.1f}%", delta_color=color)
-
-    # Liquidation warning
-    if margin_ratio >= 100:
-        st.error("⚠️ LIQUIDATION RISK! Your margin ratio is at or above 100%")
-    elif margin_ratio >= 80:
-        st.warning("⚠️ HIGH RISK! Your margin ratio is approaching liquidation levels")
+    # Current price per symbol, taken once from the position-aligned price column
+    symbol_prices = pnl_df.groupby('crypto', sort=False)['current_price'].first()
 
     # PnL breakdown table
     st.subheader("Position Breakdown")
-    pnl_df = pd.DataFrame(liquidation_data)
-    pnl_df['pnl_formatted'] = pnl_df['pnl'].apply(lambda x: f"${x:.2f}")
-    pnl_df['price_change_%'] = ((pnl_df['current_price'] - pnl_df['entry_price']) / pnl_df['entry_price'] * 100).round(2)
+    pnl_df['price_change_%'] = (pnl_df['current_price'] - pnl_df['entry_price']) / pnl_df['entry_price'] * 100
 
     st.dataframe(
-        pnl_df[['crypto', 'type', 'entry_price', 'current_price', 'price_change_%', 'pnl_formatted', 'leverage']],
+        pnl_df[['crypto', 'type', 'entry_price', 'current_price', 'price_change_%', 'pnl', 'leverage']],
+        column_config={
+            'entry_price': PRICE_COLUMN,
+            'current_price': PRICE_COLUMN,
+            'price_change_%': PERCENT_COLUMN,
+            'pnl': USDT_COLUMN,
+            'leverage': LEVERAGE_COLUMN
+        },
         use_container_width=True
     )
 
@@ -497,16 +1007,7 @@ if st.session_state.positions:
 
     with tab3:
         # PnL by position chart
-        fig_pnl = px.bar(
-            pnl_df,
-            x='crypto',
-            y='pnl',
-            color='type',
-            title="PnL by Position",
-            labels={'pnl': 'PnL (USDT)', 'crypto': 'Cryptocurrency'},
-            color_discrete_map={'LONG': 'green', 'SHORT': 'red'}
-        )
-        fig_pnl.add_hline(y=0, line_dash="dash", line_color="gray")
+        fig_pnl = build_pnl_bar(pnl_df[['crypto', 'type', 'pnl']])
         st.plotly_chart(fig_pnl, use_container_width=True)
 
     with tab2:
@@ -516,49 +1017,15 @@ if st.session_state.positions:
         selected_crypto = st.selectbox("Select Crypto for Analysis", unique_cryptos)
 
         # Get the position for selected crypto
-        selected_pos = next(pos for pos in st.session_state.positions if pos['crypto'] == selected_crypto)
-        current_price = current_prices[selected_crypto]
-
-        # Create price range
-        price_range = np.linspace(current_price * 0.5, current_price * 1.5, 100)
-        pnl_range = []
-
-        for price in price_range:
-            if selected_pos['type'] == 'LONG':
-                pnl = (price - selected_pos['entry_price']) * selected_pos['quantity']
-            else:
-                pnl = (selected_pos['entry_price'] - price) * selected_pos['quantity']
-            pnl_range.append(pnl)
-
-        fig_sensitivity = go.Figure()
-        fig_sensitivity.add_trace(go.Scatter(
-            x=price_range,
-            y=pnl_range,
-            mode='lines',
-            name=f"{selected_crypto} PnL",
-            line=dict(color='blue', width=2)
-        ))
-
-        # Add current price line
-        fig_sensitivity.add_vline(
-            x=current_price,
-            line_dash="dash",
-            line_color="orange",
-            annotation_text="Current Price"
-        )
-
-        # Add break-even line
-        fig_sensitivity.add_hline(
-            y=0,
-            line_dash="dash",
-            line_color="gray",
-            annotation_text="Break Even"
-        )
-
-        fig_sensitivity.update_layout(
-            title=f"Price Sensitivity for {selected_crypto}",
-            xaxis_title="Price (USDT)",
-            yaxis_title="PnL (USDT)"
+        selected_pos = pos_by_crypto[selected_crypto]
+        current_price = symbol_prices[selected_crypto]
+
+        fig_sensitivity = build_sensitivity(
+            selected_crypto,
+            selected_pos['type'],
+            selected_pos['entry_price'],
+            selected_pos['quantity'],
+            current_price
         )
 
         st.plotly_chart(fig_sensitivity, use_container_width=True)
@@ -568,137 +1035,54 @@ if st.session_state.positions:
         st.subheader("Cross Margin Liquidation Analysis")
 
         # Group positions by crypto and direction to show how Binance actually handles them
-        grouped_positions = {}
-        for pos in st.session_state.positions:
-            key = f"{pos['crypto']}_{pos['type']}"
-            if key not in grouped_positions:
-                grouped_positions[key] = {
-                    'crypto': pos['crypto'],
-                    'type': pos['type'],
-                    'total_size': 0,
-                    'weighted_entry_price': 0,
-                    'total_margin': 0,
-                    'positions': []
-                }
-
-            grouped_positions[key]['total_size'] += pos['position_size']
-            grouped_positions[key]['total_margin'] += pos['margin_used']
-            grouped_positions[key]['positions'].append(pos)
-
-        # Calculate weighted average entry prices for grouped positions
-        for key, group in grouped_positions.items():
-            total_quantity = 0
-            weighted_price_sum = 0
-
-            for pos in group['positions']:
-                quantity = pos['quantity']
-                total_quantity += quantity
-                weighted_price_sum += pos['entry_price'] * quantity
-
-            group['weighted_entry_price'] = weighted_price_sum / total_quantity if total_quantity > 0 else 0
-            group['average_leverage'] = group['total_size'] / group['total_margin'] if group['total_margin'] > 0 else 1
+        grouped_positions, total_group_mm = build_groups(positions_tuple)
+
+        # Cross margin figures for every group in one vectorized pass
+        groups_df = pd.DataFrame(list(grouped_positions.values()))
+        group_prices = groups_df['crypto'].map(symbol_prices)
+        group_pnls, liq_prices, distances_to_liq = compute_cross_margin(
+            groups_df['weighted_entry_price'].to_numpy(dtype=float),
+            groups_df['total_quantity'].to_numpy(dtype=float),
+            groups_df['total_size'].to_numpy(dtype=float),
+            groups_df['avg_mmr'].to_numpy(dtype=float),
+            np.where(groups_df['type'] == 'LONG', 1.0, -1.0),
+            group_prices.to_numpy(dtype=float),
+            wallet_balance
+        )
 
         st.subheader("📊 Binance Position Grouping (How Binance Actually Sees Your Positions)")
 
         # Display grouped positions
-        grouped_data = []
-        for key, group in grouped_positions.items():
-            # Calculate maintenance margin for the grouped position
-            avg_mmr = sum(pos['maintenance_margin_rate'] for pos in group['positions']) / len(group['positions'])
-            maintenance_margin = group['total_size'] * avg_mmr
-
-            # Calculate Binance-style cross margin liquidation price
-            # This considers the entire wallet balance and other positions' PnL
-
-            # Calculate total unrealized PnL from ALL OTHER positions
-            other_positions_pnl = 0
-            for other_key, other_group in grouped_positions.items():
-                if other_key != key:  # Exclude current position group
-                    other_current_price = current_prices.get(other_group['crypto'], other_group['weighted_entry_price'])
-                    other_total_quantity = sum(pos['quantity'] for pos in other_group['positions'])
-
-                    if other_group['type'] == 'LONG':
-                        other_pnl = (other_current_price - other_group['weighted_entry_price']) * other_total_quantity
-                    else:
-                        other_pnl = (other_group['weighted_entry_price'] - other_current_price) * other_total_quantity
-
-                    other_positions_pnl += other_pnl
-
-            # Calculate total maintenance margin from ALL OTHER positions
-            other_maintenance_margin = 0
-            for other_key, other_group in grouped_positions.items():
-                if other_key != key:
-                    other_avg_mmr = sum(pos['maintenance_margin_rate'] for pos in other_group['positions']) / len(other_group['positions'])
-                    other_maintenance_margin += other_group['total_size'] * other_avg_mmr
-
-            # Available balance for this position = wallet + other PnL - other maintenance margins
-            available_balance = wallet_balance + other_positions_pnl - other_maintenance_margin
-
-            # Position details
-            position_quantity = sum(pos['quantity'] for pos in group['positions'])
-            position_value = group['total_size']  # Position size in USDT
-
-            # Binance cross margin liquidation price formula
-            if group['type'] == 'LONG':
-                # For LONG: Price falls to liquidation when unrealized loss + maintenance margin = available balance
-                # Liquidation PnL = -(available_balance - maintenance_margin)
-                # (liq_price - entry_price) * quantity = -(available_balance - maintenance_margin)
-                # liq_price = entry_price - (available_balance - maintenance_margin) / quantity
-                liq_price = group['weighted_entry_price'] - (available_balance - maintenance_margin) / position_quantity
-            else:
-                # For SHORT: Price rises to liquidation when unrealized loss + maintenance margin = available balance
-                # Liquidation PnL = -(available_balance - maintenance_margin)
-                # (entry_price - liq_price) * quantity = -(available_balance - maintenance_margin)
-                # liq_price = entry_price + (available_balance - maintenance_margin) / quantity
-                liq_price = group['weighted_entry_price'] + (available_balance - maintenance_margin) / position_quantity
-
-            # Ensure liquidation price is positive and reasonable
-            if liq_price <= 0:
-                liq_price = group['weighted_entry_price'] * 0.01 if group['type'] == 'LONG' else group['weighted_entry_price'] * 100
-
-            current_price = current_prices.get(group['crypto'], group['weighted_entry_price'])
-
-            # Calculate current PnL for this grouped position
-            total_quantity = sum(pos['quantity'] for pos in group['positions'])
-            if group['type'] == 'LONG':
-                group_pnl = (current_price - group['weighted_entry_price']) * total_quantity
-            else:
-                group_pnl = (group['weighted_entry_price'] - current_price) * total_quantity
-
-            distance_to_liq = abs((liq_price - current_price) / current_price * 100)
-
-            grouped_data.append({
-                'crypto': group['crypto'],
-                'type': group['type'],
-                'positions_count': len(group['positions']),
-                'total_size_usdt': group['total_size'],
-                'weighted_avg_entry': group['weighted_entry_price'],
-                'avg_leverage': group['average_leverage'],
-                'current_price': current_price,
-                'liquidation_price': liq_price,
-                'distance_to_liq_%': distance_to_liq,
-                'current_pnl': group_pnl,
-                'maintenance_margin': maintenance_margin
-            })
+        grouped_df = pd.DataFrame({
+            'crypto': groups_df['crypto'],
+            'type': groups_df['type'],
+            'positions_count': groups_df['positions_count'],
+            'total_size_usdt': groups_df['total_size'],
+            'weighted_avg_entry': groups_df['weighted_entry_price'],
+            'avg_leverage': groups_df['average_leverage'],
+            'current_price': group_prices,
+            'liquidation_price': liq_prices,
+            'distance_to_liq_%': distances_to_liq,
+            'current_pnl': group_pnls,
+            'maintenance_margin': groups_df['maintenance_margin']
+        })
 
         # Update total_maintenance_margin_grouped for use in footer
-        total_maintenance_margin_grouped = sum(row['maintenance_margin'] for row in grouped_data) if grouped_data else 0
+        total_maintenance_margin_grouped = total_group_mm
 
-        grouped_df = pd.DataFrame(grouped_data)
         if not grouped_df.empty:
-            # Format the dataframe for display
-            display_df = grouped_df.copy()
-            display_df['total_size_usdt'] = display_df['total_size_usdt'].apply(lambda x: f"${x:.2f}")
-            display_df['weighted_avg_entry'] = display_df['weighted_avg_entry'].apply(lambda x: f"${x:.6f}")
-            display_df['current_price'] = display_df['current_price'].apply(lambda x: f"${x:.6f}")
-            display_df['liquidation_price'] = display_df['liquidation_price'].apply(lambda x: f"${x:.6f}")
-            display_df['current_pnl'] = display_df['current_pnl'].apply(lambda x: f"${x:.2f}")
-            display_df['avg_leverage'] = display_df['avg_leverage'].apply(lambda x: f"{x:.1f}x")
-            display_df['distance_to_liq_%'] = display_df['distance_to_liq_%'].apply(lambda x: f"{x:.2f}%")
-
             st.dataframe(
-                display_df[['crypto', 'type', 'positions_count', 'total_size_usdt', 'weighted_avg_entry',
+                grouped_df[['crypto', 'type', 'positions_count', 'total_size_usdt', 'weighted_avg_entry',
                             'avg_leverage', 'current_price', 'liquidation_price', 'distance_to_liq_%', 'current_pnl']],
+                column_config={
+                    'total_size_usdt': USDT_COLUMN,
+                    'weighted_avg_entry': PRICE_COLUMN,
+                    'avg_leverage': st.column_config.NumberColumn(format="%.1fx"),
+                    'current_price': PRICE_COLUMN,
+                    'liquidation_price': PRICE_COLUMN,
+                    'distance_to_liq_%': PERCENT_COLUMN,
+                    'current_pnl': USDT_COLUMN
+                },
                 use_container_width=True
             )
 
@@ -719,22 +1103,14 @@ if st.session_state.positions:
             st.subheader("🔄 Cross Margin Position Interactions")
             st.markdown("**How your positions affect each other's liquidation prices:**")
 
-            for key, group in grouped_positions.items():
-                current_price = current_prices.get(group['crypto'], group['weighted_entry_price'])
-                total_quantity = sum(pos['quantity'] for pos in group['positions'])
-
-                if group['type'] == 'LONG':
-                    group_pnl = (current_price - group['weighted_entry_price']) * total_quantity
-                else:
-                    group_pnl = (group['weighted_entry_price'] - current_price) * total_quantity
-
-                pnl_status = "📈 Helping" if group_pnl > 0 else "📉 Hurting" if group_pnl < 0 else "➡️ Neutral"
-                st.markdown(f"- **{group['crypto']} {group['type']}**: {pnl_status} other positions (PnL: ${group_pnl:.2f})")
+            for group_crypto, group_type, pnl in zip(grouped_df['crypto'], grouped_df['type'], grouped_df['current_pnl']):
+                pnl_status = "📈 Helping" if pnl > 0 else "📉 Hurting" if pnl < 0 else "➡️ Neutral"
+                st.markdown(f"- **{group_crypto} {group_type}**: {pnl_status} other positions (PnL: ${pnl:.2f})")
         else:
             st.info("Add more positions to see cross margin interactions!")
 
         # Show liquidation sequence
-        if grouped_data:
+        if not grouped_df.empty:
             st.subheader("🔴 Liquidation Risk Ranking")
             risk_df = grouped_df.copy()
             risk_df = risk_df.sort_values('distance_to_liq_%')
@@ -754,27 +1130,27 @@ if st.session_state.positions:
 
         # Individual positions breakdown (for reference)
         st.subheader("📋 Individual Positions (Before Grouping)")
-        individual_scenarios = []
+        individual_df = positions_df.rename(columns={'position_size': 'size'})
+        individual_df['position_id'] = np.arange(1, len(individual_df) + 1)
 
-        for i, pos in enumerate(st.session_state.positions):
-            if pos['type'] == 'LONG':
-                individual_liq_price = pos['entry_price'] * (1 - 1/pos['leverage'] + pos['maintenance_margin_rate'])
-            else:
-                individual_liq_price = pos['entry_price'] * (1 + 1/pos['leverage'] - pos['maintenance_margin_rate'])
-
-            individual_scenarios.append({
-                'position_id': i+1,
-                'crypto': pos['crypto'],
-                'type': pos['type'],
-                'entry_price': f"${pos['entry_price']:.6f}",
-                'leverage': f"{pos['leverage']}x",
-                'size': f"${pos['position_size']:.2f}",
-                'individual_liq_price': f"${individual_liq_price:.6f}",
-                'margin_used': f"${pos['margin_used']:.2f}"
-            })
-
-        individual_df = pd.DataFrame(individual_scenarios)
-        st.dataframe(individual_df, use_container_width=True)
+        # Isolated liquidation price of every position at once:
+        # LONG = entry * (1 - 1/leverage + mmr), SHORT = entry * (1 + 1/leverage - mmr)
+        individual_df['individual_liq_price'] = individual_df['entry_price'] * (
+            1 - individual_df['side'] * (1 / individual_df['leverage'] - individual_df['maintenance_margin_rate'])
+        )
+
+        st.dataframe(
+            individual_df[['position_id', 'crypto', 'type', 'entry_price', 'leverage', 'size',
+                           'individual_liq_price', 'margin_used']],
+            column_config={
+                'entry_price': PRICE_COLUMN,
+                'leverage': LEVERAGE_COLUMN,
+                'size': USDT_COLUMN,
+                'individual_liq_price': PRICE_COLUMN,
+                'margin_used': USDT_COLUMN
+            },
+            use_container_width=True
+        )
 
 else:
     st.info("Add some positions to start calculating PnL and liquidation prices!")
@@ -791,33 +1167,17 @@ else:
     Then watch how your PnL changes in real-time with live market prices!
     """)
 
+# Account metrics for the footer, computed once from the figures above
+metrics = {
+    'wallet': float(wallet_balance),
+    'balance': float(wallet_balance + total_pnl),
+    'mm': float(total_maintenance_margin_grouped),
+    'ratio': float(margin_ratio)
+}
+
 # Footer
 st.markdown("---")
-st.info(f"""
-        **How Binance Cross Margin Liquidation Actually Works:**
-        
-        1️⃣ **Position Grouping**: Binance groups positions by crypto + direction (LONG/SHORT)
-           - Multiple BTCUSDT LONG positions → 1 combined BTCUSDT LONG position
-           - Entry price becomes weighted average based on position sizes
-           
-        2️⃣ **Dynamic Liquidation Prices**: Unlike isolated margin, liquidation prices change in real-time
-           - Considers your entire wallet balance: ${wallet_balance:.2f}
-           - Includes unrealized PnL from OTHER positions
-           - Accounts for maintenance margins from ALL positions
-           
-        3️⃣ **Cross Margin Formula**: For each position group:
-           - **LONG Liquidation** = Entry Price - (Available Balance - Maintenance Margin) ÷ Quantity
-           - **SHORT Liquidation** = Entry Price + (Available Balance - Maintenance Margin) ÷ Quantity
-           - Available Balance = Wallet + Other Positions PnL - Other Maintenance Margins
-        
-        4️⃣ **Liquidation Trigger**: When Total Account Balance ≤ Total Maintenance Margin
-           - Current condition: ${wallet_balance + total_pnl:.2f} vs ${total_maintenance_margin_grouped:.2f} required
-           - Margin Ratio: {margin_ratio:.1f}% (liquidation at 100%)
-           
-        5️⃣ **Key Insight**: Profitable positions extend liquidation prices of losing positions!
-           - If you have a winning ETHUSDT position, your BTCUSDT liquidation price becomes more favorable
-           - Losing positions make other positions' liquidation prices worse
-        """)
+st.info(build_footer(**metrics))
 st.markdown("---")
 st.markdown("""
 <div style='text-align: center'>